@@ -6,6 +6,9 @@ from micropython import const
 _CONVERT = const(0x44)
 _RD_SCRATCH = const(0xBE)
 _WR_SCRATCH = const(0x4E)
+# supported family codes 0x10 (DS18S20), 0x22 (DS1822), 0x28 (DS18B20) as a bit mask relative to
+# 0x10 so it stays a small int
+_FAMILY_MASK = const(1 | 1 << (0x22 - 0x10) | 1 << (0x28 - 0x10))
 
 
 # Note about parasitically powered DS18B20 sensors: these sensors need a strong pull-up when
@@ -22,25 +25,38 @@ class DS18X20:
     def __init__(self, onewire):
         self.ow = onewire
         self.buf = bytearray(9)
+        self._mv = memoryview(self.buf)
 
     def __repr__(self):
         return "DS18X20(%r)" % self.ow
 
+    # _ensure_od switches the OW pin back to open drain unless it's known to be there already, the
+    # flag is kept on the OneWire object because all devices on the bus share the pin
+    def _ensure_od(self):
+        ow = self.ow
+        if not ow._od:
+            pin = ow.pin
+            pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
+            ow._od = True
+
     def scan(self):
-        pin = self.ow.pin
-        pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
-        return [rom for rom in self.ow.scan() if rom[0] in (0x10, 0x22, 0x28)]
+        self._ensure_od()
+        return [
+            rom
+            for rom in self.ow.scan()
+            if 0x10 <= rom[0] <= 0x28 and (_FAMILY_MASK >> (rom[0] - 0x10)) & 1
+        ]
 
     def convert_temp(self):
         pin = self.ow.pin
         self.ow.reset()
         pin.init(pin.OUT, value=1)  # switch to strong drive to power conversion
+        self.ow._od = False
         self.ow.writebyte(self.ow.SKIP_ROM)
         self.ow.writebyte(_CONVERT)
 
     def read_scratch(self, rom):
-        pin = self.ow.pin
-        pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
+        self._ensure_od()
         self.ow.select_rom(rom)
         self.ow.writebyte(_RD_SCRATCH)
         self.ow.readinto(self.buf)
@@ -48,8 +64,7 @@ class DS18X20:
         return self.buf
 
     def write_scratch(self, rom, buf):
-        pin = self.ow.pin
-        pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
+        self._ensure_od()
         self.ow.select_rom(rom)
         self.ow.writebyte(_WR_SCRATCH)
         self.ow.write(buf)
@@ -60,28 +75,23 @@ class DS18X20:
         self.buf[1] = 0
         conf = (((bits - 9) & 3) << 5) | 0x1F
         self.buf[2] = conf
-        self.write_scratch(rom, memoryview(self.buf[0:3]))
+        self.write_scratch(rom, self._mv[0:3])
         check_buf = self.read_scratch(rom)
         if check_buf[2] != conf:
             raise ValueError("Config failed")
 
     def read_temp(self, rom):
-        pin = self.ow.pin
-        pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
         buf = self.read_scratch(rom)
         if rom[0] == 0x10:
-            # DS18S20
-            if buf[1]:
-                t = buf[0] >> 1 | 0x80
-                t = -((~t + 1) & 0xFF)
-            else:
-                t = buf[0] >> 1
+            # DS18S20: 16-bit two's complement in half degrees, sign-extend then drop the 0.5 bit
+            t = buf[1] << 8 | buf[0]
+            t -= (t & 0x8000) << 1
+            t >>= 1
             return t - 0.25 + (buf[7] - buf[6]) / buf[7]
         else:
             # DS18B20A (0x28), DS1922 (0x22)
             t = buf[1] << 8 | buf[0]
             if t == 0x0550:
                 raise ValueError("Invalid temperature")
-            if t & 0x8000:  # sign bit set
-                t = -((t ^ 0xFFFF) + 1)
+            t -= (t & 0x8000) << 1  # sign-extend
             return t / 16
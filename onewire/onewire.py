@@ -16,6 +16,7 @@ class OneWire:
     def __init__(self, pin):
         self.pin = pin
         self.pin.init(pin.OPEN_DRAIN, pin.PULL_UP)
+        self._od = True  # pin is in open-drain mode, drivers that change the mode clear this
 
     def __repr__(self):
         return "OW(%r)" % self.pin
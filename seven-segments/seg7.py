@@ -1,7 +1,9 @@
 # Seven segment display of hex digits.
 # From https://stackoverflow.com/a/35566101/3807231
 
+import micropython
 from micropython import const
+from array import array
 
 # Order 7 segments clockwise from top one, with crossbar last.
 # Coordinates of each segment are (x0, y0, x1, y1)
@@ -19,6 +21,7 @@ offsets = b"\x04\x45\x56\x26\x12\x01\x15"  # same as below encoded in bytes w/ 2
 
 # Flag horizontal segment direction:
 horiz = (1, 0, 0, 1, 0, 0, 1)
+_HORIZ = const(0b1001001)  # same as horiz with segment N in bit N
 
 # Segments used for each digit; 0, 1 = off, on.
 digits = b"\x7E\x30\x6D\x79\x33\x5B\x5F\x70\x7F\x7B\x77\x1F\x4E\x3D\x4F\x47\x63"
@@ -42,6 +45,9 @@ digits = b"\x7E\x30\x6D\x79\x33\x5B\x5F\x70\x7F\x7B\x77\x1F\x4E\x3D\x4F\x47\x63"
 #    (1, 1, 0, 0, 0, 1, 1),  # 16=° (o)
 # )
 
+# Indexes of the segments that are lit for each digit
+_lit = tuple(tuple(seg for seg in range(7) if (d >> (6 - seg)) & 1) for d in digits)
+
 ord_0 = const(48)
 ord_9 = const(57)
 ord_a = const(97)
@@ -52,80 +58,120 @@ ord_dot = const(46)
 ord_oh = const(111)  # degree symbol
 
 
-def draw_number(fbuf, num_str, x, y, w=24, h=32, color=1, thick=None):
+_coord_cache = {}  # (w, h, thick) -> array of segment coordinates, see _seg_coords
+
+
+# _seg_coords returns the xa, ya, xb, yb coordinates of each of the 7 segments of a digit drawn at
+# 0:0, h being half the digit height. The result is cached as it only depends on the digit size.
+def _seg_coords(w, h, thick):
+    key = (w, h, thick)
+    coords = _coord_cache.get(key)
+    if coords is None:
+        coords = array("i", [0] * 28)  # xa, ya, xb, yb for each of the 7 segments
+        for seg in range(7):
+            oo = offsets[seg]
+            # x0:y0 top-left, x1:y1 bot right offsets for this segment
+            x0 = (oo >> 6) & 3
+            y0 = (oo >> 4) & 3
+            x1 = (oo >> 2) & 3
+            y1 = oo & 3
+            # xa:ya top-left, xb:yb bot right coords for this segment
+            i = seg << 2
+            coords[i] = x0 * w + 3 * (2 - y0) - (thick >> 1)  # +3*(2-y) creates slant
+            coords[i + 1] = y0 * h
+            coords[i + 2] = x1 * w + 3 * (2 - y1)
+            coords[i + 3] = y1 * h
+        _coord_cache[key] = coords
+    return coords
+
+
+# _draw_seg draws one segment of a digit using the coordinates produced by _seg_coords.
+# geom holds x, y, thick, and color (viper is limited to 4 args).
+@micropython.viper
+def _draw_seg(fbuf, seg: int, coords: ptr32, geom: ptr32):
+    x = geom[0]
+    y = geom[1]
+    thick = geom[2]
+    color = geom[3]
+    d0 = (thick - 1) >> 1  # minus offset due to thickness
+    d1 = d0 + 1
+    i = seg << 2
+    xa = x + coords[i]
+    ya = y + coords[i + 1]
+    xb = x + coords[i + 2]
+    yb = y + coords[i + 3]
+    horizontal = (_HORIZ >> seg) & 1
+    for t in range(thick):
+        d = t - d0
+        da = d
+        if d < 0:
+            da = 0 - d
+        if horizontal:
+            # horizontal segments are axis aligned, the slant only shifts them sideways
+            x0 = xa + d1 + da
+            x1 = xb - d1 - da
+            if x1 >= x0:
+                fbuf.hline(x0, ya + d, x1 - x0 + 1, color)
+            else:
+                # segment shorter than its thickness (thick close to w), line draws it reversed
+                fbuf.line(x0, ya + d, x1, ya + d, color)
+        else:
+            # vertical segments are slanted
+            fbuf.line(xa + d, ya + d1 + da, xb + d, yb - d1 - da, color)
+
+
+# draw_number draws num_str, which may be a str or bytes.
+# It returns the width of the rendered string, if measure is true it only computes that width and
+# doesn't draw anything (fbuf may be None).
+@micropython.native
+def draw_number(fbuf, num_str, x, y, w=24, h=32, color=1, thick=None, measure=False):
+    lit = _lit  # locals are faster than globals in the segment loop
     if not thick:
         thick = (w + 4) >> 3
     if thick & 1 == 0:
         thick += 1
     h = h // 2
-    for n in num_str.encode("utf-8"):
+    if not measure:
+        coords = _seg_coords(w, h, thick)
+        geom = array("i", (x, y, thick, color))  # args for _draw_seg
+    x0 = x
+    is_str = not isinstance(num_str, (bytes, bytearray))
+    for n in num_str:
+        if is_str:
+            n = ord(n)  # only ascii chars are supported, so no need to encode
         if n == ord_oh:
             n = ord_g
         if n < ord_0 or n > ord_9 and n < ord_a or n > ord_g:
             # it's not a hex digit
             d0 = (thick - 1) >> 1
             if n == ord_dot:
-                y0 = y + (h << 1)
-                fbuf.fill_rect(x - d0, y0 - d0, thick, thick, color)
+                if not measure:
+                    y0 = y + (h << 1)
+                    fbuf.fill_rect(x - d0, y0 - d0, thick, thick, color)
                 x += 1 + (w >> 1)
             elif n == ord_colon:
-                y0 = y + h - (h >> 2)
-                y1 = y0 + (h >> 1)
-                fbuf.fill_rect(x + 3 - d0 + 2, y0 - d0, thick, thick, color)
-                fbuf.fill_rect(x + 3 - d0, y1 - d0, thick, thick, color)
+                if not measure:
+                    y0 = y + h - (h >> 2)
+                    y1 = y0 + (h >> 1)
+                    fbuf.fill_rect(x + 3 - d0 + 2, y0 - d0, thick, thick, color)
+                    fbuf.fill_rect(x + 3 - d0, y1 - d0, thick, thick, color)
                 x += 3 + (w >> 1)
             elif n == ord_space:
                 x += w + (w >> 1)
         else:
             # it's a hex digit
-            if n <= ord_9:
-                n = n - ord_0
-            else:
-                n = n + 10 - ord_a
-            d0 = (thick - 1) >> 1  # minus offset due to thickness
-            d1 = d0 + 1
-            for seg in range(7):
-                on = (digits[n] >> (6 - seg)) & 1
-                if not on:
-                    continue
-                oo = offsets[seg]
-                # x0:y0 top-left, x1:y1 bot right offsets for this segment
-                x0 = (oo >> 6) & 3
-                y0 = (oo >> 4) & 3
-                x1 = (oo >> 2) & 3
-                y1 = oo & 3
-                # xa:ya top-left, xb:yb bot right coords for this segment
-                xa = x + x0 * w + 3 * (2 - y0) - (thick//2) # +3*(2-y) creates slant
-                ya = y + y0 * h
-                xb = x + x1 * w + 3 * (2 - y1)
-                yb = y + y1 * h
-                if horiz[seg]:
-                    for t in range(thick):
-                        d = -d0 + t
-                        da = d if d >= 0 else -d
-                        fbuf.line(xa + d1 + da, ya + d, xb - d1 - da, yb + d, color)
+            if not measure:
+                if n <= ord_9:
+                    n = n - ord_0
                 else:
-                    for t in range(thick):
-                        d = -d0 + t
-                        da = d if d >= 0 else -d
-                        fbuf.line(xa + d, ya + d1 + da, xb + d, yb - d1 - da, color)
+                    n = n + 10 - ord_a
+                geom[0] = x
+                for seg in lit[n]:
+                    _draw_seg(fbuf, seg, coords, geom)
 
             x += w + (w >> 1)
+    return x - x0 - (w >> 1) + 6 + 2  # back out last spacing, add slant, add thickness
 
 
 def width(num_str, w):
-    x = 0
-    for n in num_str.encode("utf-8"):
-        if n == ord_oh:
-            n = ord_g
-        if n < ord_0 or n > ord_9 and n < ord_a or n > ord_g:
-            # it's not a hex digit
-            if n == ord_dot:
-                x += 1 + (w >> 1)
-            elif n == ord_colon:
-                x += 3 + (w >> 1)
-            elif n == ord_space:
-                x += w + (w >> 1)
-        else:
-            x += w + (w >> 1)
-    return x - (w>>1) + 6 + 2 # back out last spacing, add slant, add thickness
+    return draw_number(None, num_str, 0, 0, w, measure=True)
@@ -2,6 +2,14 @@
 # Copyright (c) 2018 Martin Lundberg, see license at then end of this file
 # This version has `import time` removed: the dt must be passed into step()
 
+try:
+    import micropython
+except ImportError:
+
+    class micropython:
+        def native(f):
+            return f
+
 
 def _clamp(value, limits):
     lower, upper = limits
@@ -17,6 +25,24 @@ def _clamp(value, limits):
 class PID(object):
     """A simple PID controller."""
 
+    __slots__ = (
+        "Kp",
+        "Ki",
+        "Kd",
+        "setpoint",
+        "_min_output",
+        "_max_output",
+        "_auto_mode",
+        "proportional_on_measurement",
+        "error_map",
+        "_proportional",
+        "_integral",
+        "_derivative",
+        "_last_time",
+        "_last_output",
+        "_last_input",
+    )
+
     def __init__(
         self,
         Kp=1.0,
@@ -65,6 +91,7 @@ class PID(object):
         self.output_limits = output_limits
         self.reset()
 
+    @micropython.native
     def __call__(self, input_, dt=0):
         """
         Update the PID controller.
@@ -73,39 +100,53 @@ class PID(object):
 
         :param dt: Must be set to the timestep for this update.
         """
-        if not self.auto_mode:
+        if not self._auto_mode:
             return self._last_output
 
-        if dt <= 0:
+        if __debug__ and dt <= 0:
             raise ValueError("dt<=0 ({}), must be positive".format(dt))
 
+        Kp, Ki, Kd = self.Kp, self.Ki, self.Kd
+        lower, upper = self._min_output, self._max_output
+        last_input = self._last_input
+        error_map = self.error_map
+
         # compute error terms
         error = self.setpoint - input_
-        d_input = input_ - (self._last_input if self._last_input is not None else input_)
+        d_input = input_ - (last_input if last_input is not None else input_)
 
         # check if must map the error
-        if self.error_map is not None:
-            error = self.error_map(error)
+        if error_map is not None:
+            error = error_map(error)
 
         # compute the proportional term
         if not self.proportional_on_measurement:
             # regular proportional-on-error, simply set the proportional term
-            self._proportional = self.Kp * error
+            proportional = Kp * error
         else:
             # add the proportional error on measurement to error_sum
-            self._proportional -= self.Kp * d_input
+            proportional = self._proportional - Kp * d_input
 
-        # compute integral and derivative terms
-        self._integral += self.Ki * error * dt
-        self._integral = _clamp(self._integral, self.output_limits)  # avoid integral windup
+        # compute integral and derivative terms, clamping inline (avoid integral windup)
+        integral = self._integral + Ki * error * dt
+        if upper is not None and integral > upper:
+            integral = upper
+        elif lower is not None and integral < lower:
+            integral = lower
 
-        self._derivative = -self.Kd * d_input / dt
+        derivative = -Kd * d_input / dt
 
         # compute final output
-        output = self._proportional + self._integral + self._derivative
-        output = _clamp(output, self.output_limits)
+        output = proportional + integral + derivative
+        if upper is not None and output > upper:
+            output = upper
+        elif lower is not None and output < lower:
+            output = lower
 
         # keep track of state
+        self._proportional = proportional
+        self._integral = integral
+        self._derivative = derivative
         self._last_output = output
         self._last_input = input_
 
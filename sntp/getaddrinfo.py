@@ -1,39 +1,43 @@
 import socket
 
-print("\ntest getaddrinfo of non-existant hostname")
 try:
-    res = socket.getaddrinfo('nonexistant.example.com', 80)
-    print("getaddrinfo returned", res)
-except Exception as e:
-    print("getaddrinfo raised", e)
+    import uasyncio as asyncio
+except ImportError:
+    import asyncio
 
-print("\ntest getaddrinfo of empty hostname")
-try:
-    res = socket.getaddrinfo('', 80)
-    print("getaddrinfo returned", res)
-except Exception as e:
-    print("getaddrinfo raised", e)
 
-print("\ntest getaddrinfo of bogus hostname")
-try:
-    res = socket.getaddrinfo('..', 80)
-    print("getaddrinfo returned", res)
-except Exception as e:
-    print("getaddrinfo raised", e)
+# getaddrinfo resolves in the event loop's executor where available (CPython) so the lookups below
+# overlap, MicroPython's resolver blocks so there they run one after the other
+async def getaddrinfo(host, port):
+    loop = asyncio.get_event_loop()
+    if hasattr(loop, "getaddrinfo"):
+        return await loop.getaddrinfo(host, port)
+    return socket.getaddrinfo(host, port)
 
-print("\ntest getaddrinfo of ip address")
-try:
-    res = socket.getaddrinfo('10.10.10.10', 80)
-    print("getaddrinfo returned", len(res), "resolutions")
-except Exception as e:
-    print("getaddrinfo raised", e)
 
-print("\ntest getaddrinfo of valid hostname")
-try:
-    res = socket.getaddrinfo('micropython.org', 80)
-    print("getaddrinfo returned", len(res), "resolutions")
-except Exception as e:
-    print("getaddrinfo raised", e)
+async def test(what, host, count_only=False):
+    try:
+        res = await getaddrinfo(host, 80)
+        if count_only:
+            print("getaddrinfo of", what, "returned", len(res), "resolutions")
+        else:
+            print("getaddrinfo of", what, "returned", res)
+    except Exception as e:
+        print("getaddrinfo of", what, "raised", e)
+
+
+async def main():
+    print("\ntest getaddrinfo of non-existant, empty, bogus hostname, ip address, valid hostname")
+    await asyncio.gather(
+        test("non-existant hostname", "nonexistant.example.com"),
+        test("empty hostname", ""),
+        test("bogus hostname", ".."),
+        test("ip address", "10.10.10.10", True),
+        test("valid hostname", "micropython.org", True),
+    )
+
+
+asyncio.run(main())
 
 print("\ntest connecting to hostname")
 s = socket.socket()
@@ -23,43 +23,46 @@ def test_deltas():
     assert NTP_DELTA == mktime(2000, 1, 1, 0, 0, 0) - mktime(1900, 1, 1, 0, 0, 0)
 
 
-def test_round_trip():
-    for year in [ 2019, 2025 ]:
-        mp1 = (mktime(year, 2, 24, 17, 59, 10) - UNIX_DELTA) * 1000000 + 238000
-        ntp = sntp.mp2ntp(mp1)
-        mp2 = sntp.ntp2mp(*ntp)
-        assert abs(mp1 - mp2) < 2
-
-
-def test_mp2ntp():
-    mp1 = 1234 * 1000000 + 500000
-    ntp1got = sntp.mp2ntp(mp1)
-    ntp1exp = (1234 + NTP_DELTA, 0x80000000)
-    assert ntp1got == ntp1exp
-    # example from http://www.ntp.org/ntpfaq/NTP-s-algo.htm #5.1.2.3
-    unix2 = (0x39AEA96E, 0x000B3A75)
-    mp2 = (unix2[0] - UNIX_DELTA) * 1000000 + unix2[1]
-    ntp2got = sntp.mp2ntp(mp2)
-    ntp2exp = (0xBD5927EE, 0xBC616000)
-    print("%x %x" % (ntp2got[1], ntp2exp[1]))
-    assert ntp2got[0] == ntp2exp[0]
-    assert abs(ntp2got[1] - ntp2exp[1]) < (2 ** 32) / 1000000
-
-
-def test_ntp2mp():
-    ntp1 = (NTP_DELTA, 0x80000000)
-    mp1got = sntp.ntp2mp(*ntp1)
-    mp1exp = 500000
-    assert mp1got == mp1exp
-    # example from http://www.ntp.org/ntpfaq/NTP-s-algo.htm #5.1.2.3
-    ntp2 = (0xBD5927EE, 0xBC616000)
-    mp2got = sntp.ntp2mp(*ntp2)
-    unix2got = divmod(mp2got, 1000000)
-    unix2got = (unix2got[0] + UNIX_DELTA, unix2got[1])
-    unix2exp = (0x39AEA96E, 0x000B3A75)
-    print("%x %x" % (unix2got[1], unix2exp[1]))
-    assert unix2got[0] == unix2exp[0]
-    assert abs(unix2got[1] - unix2exp[1]) < 2
+@pytest.mark.parametrize("year", [2019, 2025])
+def test_round_trip(year):
+    mp1 = (mktime(year, 2, 24, 17, 59, 10) - UNIX_DELTA) * 1000000 + 238000
+    ntp = sntp.mp2ntp(mp1)
+    mp2 = sntp.ntp2mp(*ntp)
+    assert abs(mp1 - mp2) < 2
+
+
+# mp2ntp/ntp2mp cases: (mp microseconds, ntp (secs, frac), max error in the fractional part)
+# the second case is the example from http://www.ntp.org/ntpfaq/NTP-s-algo.htm #5.1.2.3
+@pytest.mark.parametrize(
+    "mp, ntp, frac_tol",
+    [
+        (1234 * 1000000 + 500000, (1234 + NTP_DELTA, 0x80000000), 1),
+        (
+            (0x39AEA96E - UNIX_DELTA) * 1000000 + 0x000B3A75,
+            (0xBD5927EE, 0xBC616000),
+            (2 ** 32) / 1000000,
+        ),
+    ],
+)
+def test_mp2ntp(mp, ntp, frac_tol):
+    ntpgot = sntp.mp2ntp(mp)
+    print("%x %x" % (ntpgot[1], ntp[1]))
+    assert ntpgot[0] == ntp[0]
+    assert abs(ntpgot[1] - ntp[1]) < frac_tol
+
+
+@pytest.mark.parametrize(
+    "ntp, mp, usec_tol",
+    [
+        ((NTP_DELTA, 0x80000000), 500000, 1),
+        ((0xBD5927EE, 0xBC616000), (0x39AEA96E - UNIX_DELTA) * 1000000 + 0x000B3A75, 2),
+    ],
+)
+def test_ntp2mp(ntp, mp, usec_tol):
+    mpgot = sntp.ntp2mp(*ntp)
+    print("%x %x" % (mpgot % 1000000, mp % 1000000))
+    assert mpgot // 1000000 == mp // 1000000
+    assert abs(mpgot % 1000000 - mp % 1000000) < usec_tol
 
 @pytest.mark.asyncio
 async def test_poll():
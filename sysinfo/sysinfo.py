@@ -1,6 +1,6 @@
 # sysinfo.py - System information task transmitting basic telemetry via MQTT
 # Copyright © 2020 by Thorsten von Eicken.
-import micropython, gc, time, uasyncio as asyncio, logging, network
+import micropython, gc, time, uasyncio as asyncio, logging, network, ujson
 from board import get_battery_voltage
 
 try:
@@ -14,6 +14,18 @@ _upticks = None  # milliseconds of uptime (becomes a bigint unlike time_ms())
 _lastticks = None  # helper to keep track of _upticks
 _mqttconn = 0  # number of MQTT connections
 
+# info message, updated in-place and serialized to json for each send
+_info = {
+    "up": 0,
+    "free": 0,
+    "cont_free": 0,
+    "mqtt_conn": 0,
+    "rssi": None,
+    "batt": 0,
+    "c_free": 0,
+    "c_cont_free": 0,
+}
+
 
 # info_sender is a task (must be launched using create_task) that sends an MQTT info message
 # every interval seconds to the specified topic.
@@ -21,36 +33,51 @@ async def info_sender(mqclient, topic, interval):
     global _upticks, _lastticks
     log.info(topic)
     wlan_sta = network.WLAN(network.STA_IF)
+    # bind functions used every iteration to locals
+    ticks_ms = time.ticks_ms
+    ticks_diff = time.ticks_diff
+    collect = gc.collect
+    mem_free = gc.mem_free
+    mem_maxfree = gc.mem_maxfree
+    sta_status = wlan_sta.status
+    heap_info = idf_heap_info
     while True:
         try:
-            gc.collect()
-            f = gc.mem_free()
-            mf = gc.mem_maxfree()
-            t = time.ticks_ms()
+            collect()
+            f = mem_free()
+            mf = mem_maxfree()
+            t = ticks_ms()
             if _upticks is None:
                 _upticks = t  # we hope it hasn't rolled-over yet...
             else:
-                _upticks += time.ticks_diff(t, _lastticks)
+                _upticks += ticks_diff(t, _lastticks)
             _lastticks = t
             bv = get_battery_voltage() * 1000
             try:
-                rssi = wlan_sta.status("rssi")
+                rssi = sta_status("rssi")
             except ValueError:
-                rssi = "null"
+                rssi = None
             idf_f = 0  # esp-idf free bytes
             idf_mf = 0  # esp-idf max contig free block
-            if idf_heap_info:
-                for mi in idf_heap_info(HEAP_DATA):
+            if heap_info is not None:
+                heaps = heap_info(HEAP_DATA)
+                for mi in heaps:
                     idf_f += mi[1]  # sum free bytes
                     if mi[2] > idf_mf:
                         idf_mf = mi[2]  # max of contig free
+                del heaps  # let gc reclaim the list before publishing
             # compose json message with data
-            msg = (
-                '{"up":%d,"free":%d,"cont_free":%d,"mqtt_conn":%d,"rssi":%s,"batt":%d,'
-                '"c_free":%d,"c_cont_free":%d}'
-                % (_upticks // 1000, f, mf, _mqttconn, rssi, bv, idf_f, idf_mf)
-            )
-            log.info(msg)
+            info = _info
+            info["up"] = _upticks // 1000
+            info["free"] = f
+            info["cont_free"] = mf
+            info["mqtt_conn"] = _mqttconn
+            info["rssi"] = rssi
+            info["batt"] = int(bv)
+            info["c_free"] = idf_f
+            info["c_cont_free"] = idf_mf
+            msg = ujson.dumps(info)
+            log.debug("info: %d bytes", len(msg))
             await mqclient.publish(topic, msg, qos=0)
             # micropython.mem_info()
         except Exception as e:
@@ -65,8 +92,8 @@ async def _on_mqtt(conn):
 
 
 async def _on_init(mqclient, topic, interval):
-    asyncio.sleep(1)  # skip initial flurry of activity
-    asyncio.get_event_loop().create_task(info_sender(mqclient, topic, interval))
+    await asyncio.sleep(1)  # skip initial flurry of activity
+    asyncio.create_task(info_sender(mqclient, topic, interval))
 
 
 def start(mqtt, config):
@@ -65,6 +65,30 @@ def test_get_two_bitfield():
         assert f.get_bitfield(4) == value2
 
 
+def test_hdr_cache_bounded():
+    f = Font("luRS24_te.u8f")
+    n = 0
+    for cp in range(0x2200):
+        if f.glyph_header(cp) is not None:
+            n += 1
+            assert len(f.hdr_cache) <= u8g2_font.HDR_CACHE_SZ
+    assert n > u8g2_font.HDR_CACHE_SZ
+    # headers are still correct after the cache was cleared
+    assert f.glyph_header(65) == f.glyph_hdr(f.find_glyph(65) * 8)
+
+
+def test_glyph_header_signed():
+    # the x offset, y offset and char delta fields are signed, check against the BDF version of
+    # the font; glyph_header returns w, h, x, y (top of glyph above baseline), cd
+    f = Font("luRS24_te.u8f")
+    # BBX 7 3 2 9, DWIDTH 11 0
+    assert f.glyph_header(ord("-"))[:5] == (7, 3, 2, 3 + 9, 11)
+    # BBX 23 25 0 0, DWIDTH 23 0
+    assert f.glyph_header(ord("A"))[:5] == (23, 25, 0, 25 + 0, 23)
+    # descender with a negative y offset (-7), values as decoded by the original signed get_bf
+    assert f.glyph_header(ord("g"))[:5] == (16, 25, 2, 25 - 7, 21)
+
+
 pixels = []
 
 
@@ -88,15 +112,9 @@ def test_glyph_header_A():
     self.init_bitfield(gl_ix)
     w = self.get_bitfield(self.data[u8g2_font.U8_BPCW])
     h = self.get_bitfield(self.data[u8g2_font.U8_BPCH])
-    x += self.get_bitfield(self.data[u8g2_font.U8_BPCX]) - (
-        1 << (self.data[u8g2_font.U8_BPCX] - 1)
-    )
-    y -= self.get_bitfield(self.data[u8g2_font.U8_BPCY]) - (
-        1 << (self.data[u8g2_font.U8_BPCY] - 1)
-    )
-    cd = self.get_bitfield(self.data[u8g2_font.U8_BPCD]) - (
-        1 << (self.data[u8g2_font.U8_BPCD] - 1)
-    )
+    x += self.get_bitfield(self.data[u8g2_font.U8_BPCX]) - self.bias_x
+    y -= self.get_bitfield(self.data[u8g2_font.U8_BPCY]) - self.bias_y
+    cd = self.get_bitfield(self.data[u8g2_font.U8_BPCD]) - self.bias_d
     print(w, h, x, y, cd)
     # checks (against BDF version of font)
     # BBX 23 25 0 0
@@ -126,11 +144,9 @@ def test_glyph_header_hyphen():
     self.init_bitfield(gl_ix)
     w = self.get_bitfield(self.data[u8g2_font.U8_BPCW])
     h = self.get_bitfield(self.data[u8g2_font.U8_BPCH])
-    x = self.get_bitfield(self.data[u8g2_font.U8_BPCX]) - (1 << (self.data[u8g2_font.U8_BPCX] - 1))
-    y = self.get_bitfield(self.data[u8g2_font.U8_BPCY]) - (1 << (self.data[u8g2_font.U8_BPCY] - 1))
-    cd = self.get_bitfield(self.data[u8g2_font.U8_BPCD]) - (
-        1 << (self.data[u8g2_font.U8_BPCD] - 1)
-    )
+    x = self.get_bitfield(self.data[u8g2_font.U8_BPCX]) - self.bias_x
+    y = self.get_bitfield(self.data[u8g2_font.U8_BPCY]) - self.bias_y
+    cd = self.get_bitfield(self.data[u8g2_font.U8_BPCD]) - self.bias_d
     print(f"w={w} h={h} x={x} y={y} d={cd}")
     # checks (against BDF version of font)
     # BBX 7 3 2 9
@@ -166,11 +182,9 @@ def xxxtest_glyph_header_hyphen():
     self.init_bitfield(gl_ix)
     w = self.get_bitfield(self.data[u8g2_font.U8_BPCW])
     h = self.get_bitfield(self.data[u8g2_font.U8_BPCH])
-    x = self.get_bitfield(self.data[u8g2_font.U8_BPCX]) - (1 << (self.data[u8g2_font.U8_BPCX] - 1))
-    y = self.get_bitfield(self.data[u8g2_font.U8_BPCY]) - (1 << (self.data[u8g2_font.U8_BPCY] - 1))
-    cd = self.get_bitfield(self.data[u8g2_font.U8_BPCD]) - (
-        1 << (self.data[u8g2_font.U8_BPCD] - 1)
-    )
+    x = self.get_bitfield(self.data[u8g2_font.U8_BPCX]) - self.bias_x
+    y = self.get_bitfield(self.data[u8g2_font.U8_BPCY]) - self.bias_y
+    cd = self.get_bitfield(self.data[u8g2_font.U8_BPCD]) - self.bias_d
     print(w, h, x, y, cd)
     # checks (against BDF version of font)
     # BBX 7 3 2 9
@@ -184,3 +198,118 @@ def xxxtest_glyph_header_hyphen():
     pixels = []
     f.draw_glyph(setpixel, code_point, 0, 0, 1)
     # print(pixels)
+
+
+# Recorder collects the pixels drawn via hline, fill_rect, and u8g2_rect
+class Recorder:
+    width = 200
+    height = 200
+
+    def __init__(self):
+        self.pixels = set()
+
+    def hline(self, x, y, w, color):
+        self.pixels.update((x + i, y) for i in range(w))
+
+    def fill_rect(self, x, y, w, h, color):
+        for j in range(h):
+            self.hline(x, y + j, w, color)
+
+    def u8g2_rect(self, x, y, w, h, color):
+        self.fill_rect(x, y, w, h, color)
+
+
+# FB16 is a 16 bits per pixel framebuffer for the direct rendering path
+class FB16:
+    width = 200
+    height = 200
+
+    def __init__(self):
+        self.buffer = bytearray(2 * self.width * self.height)
+
+    def pixels(self):
+        w = self.width
+        return {(i % w, i // w) for i, v in enumerate(memoryview(self.buffer).cast("H")) if v}
+
+
+def test_render_paths():
+    # every glyph must render the same via plain hline, hline+fill_rect, fb.u8g2_rect, and fb16
+    f_plain = Font("luRS24_te.u8f")
+    f_rect = Font("luRS24_te.u8f")
+    rfb = Recorder()  # fb without u8g2_glyph, so glyphs are drawn via the generic path
+    f_u8g2_rect = Font("luRS24_te.u8f", fb=rfb)
+    fb16 = FB16()
+    f_fb16 = Font("luRS24_te.u8f", fb=fb16, fb16=True)
+    count = 0
+    for cp in range(0x2200):
+        if f_plain.find_glyph(cp) is None:
+            continue
+        count += 1
+        plain = set()
+        hline = lambda x, y, w, c: plain.update((x + i, y) for i in range(w))
+        f_plain.draw_glyph(hline, cp, 40, 120, 1)
+        rec = Recorder()
+        f_rect.draw_glyph(rec.hline, cp, 40, 120, 1)
+        assert rec.pixels == plain, "fill_rect cp=%d" % cp
+        rfb.pixels = set()
+        f_u8g2_rect.draw_glyph(rfb.hline, cp, 40, 120, 1)
+        assert rfb.pixels == plain, "u8g2_rect cp=%d" % cp
+        fb16.buffer[:] = bytes(len(fb16.buffer))
+        f_fb16.draw_glyph(None, cp, 40, 120, 0xFFFF)
+        assert fb16.pixels() == plain, "fb16 cp=%d" % cp
+    assert count > 400
+
+
+# ClipFB is a framebuffer with a native glyph renderer whose hline and u8g2_rect clip
+class ClipFB(Recorder):
+    width = 100
+    height = 50
+
+    def __init__(self):
+        super().__init__()
+        self.rects = 0
+
+    def u8g2_glyph(self, font_info, gl_ix, x, y, w, h, color):
+        raise AssertionError("cropped glyph passed to u8g2_glyph")
+
+    def hline(self, x, y, w, color):
+        if 0 <= y < self.height:
+            self.pixels.update((x + i, y) for i in range(w) if 0 <= x + i < self.width)
+
+    def u8g2_rect(self, x, y, w, h, color):
+        self.rects += 1
+        Recorder.fill_rect(self, x, y, w, h, color)
+
+
+def test_render_cropped():
+    # glyphs partly off-screen are drawn via the generic path and clipped by the fb
+    fb = ClipFB()
+    f = Font("luRS24_te.u8f", fb=fb)
+    plain = set()
+    hline = lambda x, y, w, c: plain.update((x + i, y) for i in range(w))
+    for x, y in [(90, 20), (-5, 20), (40, 10), (40, 60)]:
+        fb.pixels = set()
+        plain.clear()
+        f.draw_glyph(fb.hline, ord("I"), x, y, 1)
+        Font("luRS24_te.u8f").draw_glyph(hline, ord("I"), x, y, 1)
+        clipped = {(px, py) for px, py in plain if 0 <= px < fb.width and 0 <= py < fb.height}
+        assert fb.pixels == clipped
+    assert fb.rects > 0
+    # with an hline of another target the fb's u8g2_rect must not be used
+    fb.rects = 0
+    other = Recorder()
+    f.draw_glyph(other.hline, ord("I"), 95, 10, 1)
+    assert fb.rects == 0 and fb.pixels == clipped
+    plain.clear()
+    Font("luRS24_te.u8f").draw_glyph(hline, ord("I"), 95, 10, 1)
+    assert other.pixels == plain
+
+
+def test_fb16_too_small():
+    class FB:
+        width = 128
+        height = 64
+        buffer = bytearray(128 * 64 // 8)  # 1 bit per pixel
+
+    with pytest.raises(ValueError):
+        Font("luRS24_te.u8f", fb=FB(), fb16=True)
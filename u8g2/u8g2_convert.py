@@ -2,6 +2,7 @@
 # Copyright © 2020 by Thorsten von Eicken. MIT License.
 import sys
 import re
+import ast
 
 state = "outer"
 name = "unknown"
@@ -28,10 +29,11 @@ for line in sys.stdin:
         if line[-2] == ";":
             line = line[:-3] + '\\0"'  # patch bug in u8g2 library
             state = "outer"
-        d = eval(line.replace('"', 'b"', 1))
+        # decode the C string literal's escapes (octal, hex, \", \\) without evaluating the line
+        raw = line[line.index('"') + 1 : line.rindex('"')]
+        d = ast.literal_eval('b"' + raw + '"')
         # print("Got:", d)
         of.write(d)
-        for b in d:
-            op.write(b"\\x%02x" % b)
+        op.write(b"".join(b"\\x%02x" % b for b in d))
 if op:
     op.write(b"'\n")
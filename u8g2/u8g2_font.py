@@ -2,13 +2,16 @@
 #
 # u8g2 fonts from https://github.com/olikraus/u8g2
 
-import struct
+from array import array
 
 try:
     from micropython import const
     import micropython
     from time import ticks_ms, ticks_diff
+
+    _MICROPYTHON = True
 except ImportError:
+    _MICROPYTHON = False
     from time import monotonic
 
     def ticks_ms():
@@ -22,13 +25,14 @@ except ImportError:
 
     ptr8 = const
     ptr16 = const
+    ptr32 = const
 
     class micropython:
         def viper(x):
             return x
 
 
-HDR_CACHE_SZ = 100  # up to 100 cached glyph headers
+HDR_CACHE_SZ = 100  # max number of cached glyph headers, the cache is cleared when full
 
 # The font format consists of a font header followed by compressed glyphs.
 
@@ -65,10 +69,76 @@ U8_GLYPHS = const(23)  # first glyph
 # n Bytes	Bitmap (horizontal, RLE)
 
 
+# _read_run returns the run length at offset ix (in bits!) of data. The run length fields have a
+# fixed width per font, so the caller passes in the precomputed mask instead of the width.
+@micropython.viper
+def _read_run(data: ptr8, ix: int, mask: int) -> int:
+    i = ix >> 3
+    return int((data[i] | (data[i + 1] << 8)) >> (ix & 7)) & mask
+
+
+# _draw_fast decodes the RLE bitmap of a glyph starting at bit gl_ix of data and writes the set
+# pixels directly into buf, a 16-bit per pixel framebuffer. Viper is limited to 4 args, so args
+# holds: pixel index of the glyph's top-left corner, framebuffer stride (pixels), glyph width,
+# glyph height, color, bits_per_0 | bits_per_1 << 8. The glyph must lie entirely within buf.
+@micropython.viper
+def _draw_fast(data: ptr8, buf: ptr16, args: ptr32, gl_ix: int):
+    row = args[0]  # pixel index of the start of the current glyph row
+    stride = args[1]
+    w = args[2]
+    h = args[3]
+    color = args[4]
+    zbits = args[5] & 0xFF
+    obits = args[5] >> 8
+    zmask = (1 << zbits) - 1
+    omask = (1 << obits) - 1
+    cur_x = 0
+    y = 0
+    # consume runs of 0's and 1's until we reach the bottom of the glyph
+    while y < h:
+        i = gl_ix >> 3
+        zeros = int((data[i] | (data[i + 1] << 8)) >> (gl_ix & 7)) & zmask
+        gl_ix += zbits
+        i = gl_ix >> 3
+        ones = int((data[i] | (data[i + 1] << 8)) >> (gl_ix & 7)) & omask
+        gl_ix += obits
+        # repeat the run until we read a 0 bit
+        while True:
+            # skip the zeros (transparent)
+            cur_x += zeros
+            while cur_x >= w:
+                cur_x -= w
+                y += 1
+                row += stride
+            # draw the ones
+            o = ones
+            while o > 0:
+                buf[row + cur_x] = color
+                cur_x += 1
+                if cur_x >= w:
+                    cur_x = 0
+                    y += 1
+                    row += stride
+                o -= 1
+            # read next bit and repeat if it's a one
+            bit = int(data[gl_ix >> 3] >> (gl_ix & 7)) & 1
+            gl_ix += 1
+            if bit == 0:
+                break
+
+
 # Font reads a full u8g2 font from a file in compressed format and renders glyphs from the
 # compressed format as-is.
+# If a framebuffer object fb is provided, glyphs that are not cropped are rendered using its
+# u8g2_glyph method (native implementation) if it has one or, if fb16 is true, by writing directly
+# into its buffer attribute, which must hold 16 bits per pixel with a stride of fb.width pixels.
+# All other glyphs are drawn using hline, with runs spanning multiple rows drawn using the
+# u8g2_rect(x, y, w, h, color) or else the fill_rect method of the object hline is bound to, if
+# any. As this path also draws cropped glyphs, u8g2_rect must clip to the framebuffer.
+# The font data is kept as loaded (bytes, or the frozen data of a font module, which stays in
+# flash) and is passed as-is to the viper functions, so it must support the buffer protocol.
 class Font:
-    def __init__(self, filepath, hline=None, fb=None):
+    def __init__(self, filepath, hline=None, fb=None, fb16=False):
         self.name = filepath.split("/")[-1]
         if self.name.endswith(".u8f"):
             self.name = self.name[:-4]
@@ -86,48 +156,111 @@ class Font:
         desc = 256 - self.data[U8_DG]  # font descent from "g" (as positive value)
         self.height = self.ascend + desc  # total font height
         self.hdr_cache = {}  # header cache
+        self.ascii_ix = self._index_ascii()  # code point -> glyph index for the ascii portion
+        self._index_unicode()
+        d = self.data
+        # bit widths of the glyph header fields
+        self.bpcw = d[U8_BPCW]
+        self.bpch = d[U8_BPCH]
+        self.bpcx = d[U8_BPCX]
+        self.bpcy = d[U8_BPCY]
+        self.bpcd = d[U8_BPCD]
+        # biases of the signed glyph header fields
+        self.bias_x = 1 << (self.bpcx - 1)
+        self.bias_y = 1 << (self.bpcy - 1)
+        self.bias_d = 1 << (self.bpcd - 1)
+        self.zbits = self.data[U8_BP0]  # bits per run of 0's
+        self.obits = self.data[U8_BP1]  # bits per run of 1's
+        self.zmask = (1 << self.zbits) - 1
+        self.omask = (1 << self.obits) - 1
+        self._rect_hline = None  # hline for which _fill_rect was looked up
+        self._fill_rect = None  # fb.u8g2_rect or fill_rect of the object hline is bound to, if any
+        self.fb_glyph = getattr(fb, "u8g2_glyph", None)  # native glyph rendering method of fb
+        self.fb_buf = None  # 16-bit pixel buffer of fb used by _draw_fast
+        if fb16 and self.fb_glyph is None:
+            # _draw_fast doesn't do any bounds checking, so make sure the buffer (a bytearray, as
+            # for a FrameBuffer) is big enough
+            if len(fb.buffer) < 2 * fb.width * fb.height:
+                raise ValueError("fb.buffer too small for 16 bits per pixel")
+            buf = fb.buffer
+            if not _MICROPYTHON:
+                buf = memoryview(buf).cast("H")  # index 16-bit pixels like ptr16 does in viper
+            self.fb_buf = buf
+            bits = self.zbits | self.obits << 8
+            self.fast_args = array("i", [0, fb.width, 0, 0, 0, bits])  # args for _draw_fast
+
+    # _index_ascii walks the chain of "ascii" glyphs once and returns a table mapping each code
+    # point < 0x100 to the index of its glyph's "bitcntW" field (0xFFFF if absent).
+    def _index_ascii(self):
+        data = self.data
+        ascii_ix = array("H", [0xFFFF] * 256)
+        ix = U8_GLYPHS
+        while True:
+            cp = data[ix]
+            if ascii_ix[cp] == 0xFFFF:
+                ascii_ix[cp] = ix + 2
+            off = data[ix + 1]
+            if off == 0:
+                return ascii_ix
+            ix += off
+
+    # _index_unicode parses the unicode jump table into ujt_cp, the highest code point of each
+    # block, and ujt_ix, the index of the first glyph of the block. The table ends with a 0xFFFF
+    # block.
+    def _index_unicode(self):
+        data = self.data
+        n = len(data)
+        ix = U8_GLYPHS + (data[U8_IXU] << 8 | data[U8_IXU + 1])
+        glyphs = ix
+        self.ujt_cp = array("H")
+        self.ujt_ix = array("I")
+        while ix + 3 < n:
+            glyphs += data[ix] << 8 | data[ix + 1]  # where this block starts
+            cp = data[ix + 2] << 8 | data[ix + 3]  # highest code point in this block
+            self.ujt_cp.append(cp)
+            self.ujt_ix.append(glyphs)
+            if cp == 0xFFFF:
+                break
+            ix += 4
 
     ticks = 0  # milliseconds taken by glyph rendering
 
     # find_glyph returns the index into the font data array where the glyph with the
     # requested code_point can be found. The returned index points to the "bitcntW" field.
     def find_glyph(self, code_point: int) -> int:
-        data = self.data
-        ix = 23
         if code_point < 0x100:
-            # "ascii" portion, first use offsets
-            if code_point >= 97:  # after a
-                ix += data[U8_IXa] << 8 | data[U8_IXa + 1]
-            elif code_point >= 65:  # after A
-                ix += data[U8_IXA] << 8 | data[U8_IXA + 1]
-            # linear search
-            while code_point != data[ix]:
-                off = data[ix + 1]
-                if off == 0:
-                    return None
-                ix += off
-            return ix + 2
-        else:
-            # "unicode" portion, use unicode jump table
-            ix += data[U8_IXU] << 8 | data[U8_IXU + 1]
-            glyphs = int(ix)
-            while True:
-                glyphs += data[ix] << 8 | data[ix + 1]  # where this block starts
-                cp = data[ix + 2] << 8 | data[ix + 3]  # highest code point in this block
-                if code_point <= cp:
-                    break
-                ix += 4
-                if ix > int(len(self.data)):
-                    return None
-            # linear search
-            ix = glyphs
+            return self._find_ascii(code_point)
+        return self._find_unicode(code_point)
+
+    # _find_ascii is find_glyph for code points < 0x100, using the table built at load time.
+    def _find_ascii(self, code_point: int) -> int:
+        ix = self.ascii_ix[code_point]
+        return None if ix == 0xFFFF else ix
+
+    # _find_unicode is find_glyph for code points >= 0x100. It binary searches for the first block
+    # whose highest code point is >= code_point in the jump table parsed at load time.
+    def _find_unicode(self, code_point: int) -> int:
+        data = self.data
+        ujt_cp = self.ujt_cp
+        lo = 0
+        hi = len(ujt_cp)
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if ujt_cp[mid] < code_point:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo == len(ujt_cp):
+            return None
+        # linear search
+        ix = self.ujt_ix[lo]
+        cp = data[ix] << 8 | data[ix + 1]
+        while code_point != cp:
+            if cp == 0:
+                return None
+            ix += data[ix + 2]
             cp = data[ix] << 8 | data[ix + 1]
-            while code_point != cp:
-                if cp == 0:
-                    return None
-                ix += data[ix + 2]
-                cp = data[ix] << 8 | data[ix + 1]
-            return ix + 3
+        return ix + 3
 
     # get_bf returns a bit field at offset ix (in bits!) of data, of width bits.
     # signed indicates whether the bit field is signed or not.
@@ -143,53 +276,72 @@ class Font:
         else:
             return d - (1 << (width - 1))
 
-    hdrfmt = "BBbbbI"  # struct.pack format for header info
+    if not _MICROPYTHON:
+        # on CPython get_bf is plain python and the int() casts needed by viper only slow it down
+        @staticmethod
+        def get_bf(data, ix, width, signed):
+            if width > 8:
+                raise ValueError("too wide a bitfield")
+            i = ix >> 3
+            d = ((data[i] | data[i + 1] << 8) >> (ix & 7)) & ((1 << width) - 1)
+            if not signed:
+                return d
+            return d - (1 << (width - 1))
 
-    # glyph_hdr decodes the header of a glyph from the font info and returns it as a packed
-    # struct with w, h, x, y, cd, and ix (offset for glyph data).
+    # glyph_hdr decodes the header of a glyph from the font info and returns it as a tuple
+    # with w, h, x, y, cd, and ix (offset for glyph data).
     def glyph_hdr(self, ix):
         data = self.data
+        get_bf = self.get_bf
         # width
-        bits = data[U8_BPCW]
-        w = self.get_bf(data, ix, bits, False)
+        bits = self.bpcw
+        w = get_bf(data, ix, bits, False)
         ix += bits
         # height
-        bits = data[U8_BPCH]
-        h = self.get_bf(data, ix, bits, False)
+        bits = self.bpch
+        h = get_bf(data, ix, bits, False)
         ix += bits
         # x offset
-        bits = data[U8_BPCX]
-        x = self.get_bf(data, ix, bits, True)
+        bits = self.bpcx
+        x = get_bf(data, ix, bits, False) - self.bias_x
         ix += bits
         # y offset
-        bits = data[U8_BPCY]
-        y = h + self.get_bf(data, ix, bits, True)
+        bits = self.bpcy
+        y = h + get_bf(data, ix, bits, False) - self.bias_y
         ix += bits
         # cd
-        bits = data[U8_BPCD]
-        cd = self.get_bf(data, ix, bits, True)
+        bits = self.bpcd
+        cd = get_bf(data, ix, bits, False) - self.bias_d
         ix += bits
         #
         # if ix > 0xFFFFFF:
         #     raise ValueError("ix too big (%d)" % ix)
         # print("glyph_hdr:", w, h, x, y, cd, (ix >> 16) & 0xFF, (ix >> 8) & 0xFF, ix & 0xFF)
-        return struct.pack(self.hdrfmt, w, h, x, y, cd, ix)
+        return (w, h, x, y, cd, ix)
 
     # glyph_header returns the header of a glyph using a cache. It calls glyph_hdr if the info
     # isn't cached and then enters it into the cache.
     def glyph_header(self, code_point):
-        if code_point in self.hdr_cache:
-            return struct.unpack(self.hdrfmt, self.hdr_cache[code_point])
+        hdr = self.hdr_cache.get(code_point)
+        if hdr is not None:
+            return hdr
         # construct header info
         gl_ix = self.find_glyph(code_point)
         if gl_ix is None:
             return None
+        return self._cache_hdr(code_point, gl_ix)
+
+    # _cache_hdr decodes the header of the glyph for code_point found at gl_ix and enters it into
+    # the header cache.
+    def _cache_hdr(self, code_point, gl_ix):
         hdr = self.glyph_hdr(gl_ix * 8)
-        # save in cache and return
-        self.hdr_cache[code_point] = hdr
-        if len(self.hdr_cache) == HDR_CACHE_SZ:
-            print("OOPS: font cache size reached ****")
-        return struct.unpack(self.hdrfmt, self.hdr_cache[code_point])
+        # save in cache, clearing it first if it's full: dict iteration order on MicroPython
+        # would make popping the "first" entry evict the low (most used) code points first
+        hdr_cache = self.hdr_cache
+        if len(hdr_cache) >= HDR_CACHE_SZ:
+            hdr_cache.clear()
+        hdr_cache[code_point] = hdr
+        return hdr
 
     # draw_glyph draws the glyph corresponding to code_point at position x,y, where y is the
     # baseline. It returns the delta-x to the next glyph.
@@ -197,53 +349,98 @@ class Font:
         hdr = self.glyph_header(code_point)
         if hdr is None:
             return None
+        return self._blit(hline, hdr, x, y, color)
+
+    # _blit draws the glyph with header hdr (as returned by glyph_header) at position x,y, where y
+    # is the baseline. It returns the delta-x to the next glyph.
+    def _blit(self, hline, hdr, x, y, color):
         w, h, dx, dy, cd, gl_ix = hdr
         if w == 0:  # character without pixels (e.g. space)
             return cd
         # advance to first pixel of char
         x += dx
         y -= dy
-        # if we have a framebuffer registered, call its optimized glyph rendering method if there
-        # is no cropping going on
+        # if we have a framebuffer registered, use its optimized glyph rendering method or write
+        # directly into its buffer if there is no cropping going on
         fb = self.fb
-        if fb is not None and x >= 0 and y >= 0 and x + w <= fb.width and y + h <= fb.height:
+        fb_glyph = self.fb_glyph
+        if (
+            (fb_glyph is not None or self.fb_buf is not None)
+            and x >= 0
+            and y >= 0
+            and x + w <= fb.width
+            and y + h <= fb.height
+        ):
+            if self.fb_buf is not None:
+                args = self.fast_args
+                args[0] = y * fb.width + x
+                args[2] = w
+                args[3] = h
+                args[4] = color
+                _draw_fast(self.data, self.fb_buf, args, gl_ix)
+                return cd
             font_info = self.font_info
             if font_info is None:
                 data = self.data
                 font_info = (data, data[U8_BP0], data[U8_BP1])
                 self.font_info = font_info
-            fb.u8g2_glyph(font_info, gl_ix, x, y, w, h, color)
+            fb_glyph(font_info, gl_ix, x, y, w, h, color)
             return cd
         # regular generic rendering
+        # if hline is a method of fb, use fb.u8g2_rect or, if hline is a method of an object that
+        # has a fill_rect method (e.g. a FrameBuffer), that to draw multiple full rows at once
+        if hline is not self._rect_hline:
+            self._rect_hline = hline
+            target = getattr(hline, "__self__", None)
+            rect = None
+            if target is not None and target is fb:
+                rect = getattr(fb, "u8g2_rect", None)
+            if rect is None:
+                rect = getattr(target, "fill_rect", None)
+            self._fill_rect = rect
+        fill_rect = self._fill_rect
         # draw runlengths
         cur_x = 0
         end_y = y + h
         # consume runs of 0's and 1's until we reach the bottom of the glyph
+        read_run = _read_run  # locals are faster than globals in the loop
         data = self.data
-        zbits = data[U8_BP0]
-        obits = data[U8_BP1]
+        zbits = self.zbits
+        obits = self.obits
+        zmask = self.zmask
+        omask = self.omask
         while y < end_y:
-            zeros = self.get_bf(data, gl_ix, zbits, False)
+            zeros = read_run(data, gl_ix, zmask)
             gl_ix += zbits
-            ones = self.get_bf(data, gl_ix, obits, False)
+            ones = read_run(data, gl_ix, omask)
             gl_ix += obits
             # repeat the run until we read a 0 bit
             while True:
                 # skip the zeros (transparent)
                 cur_x += zeros
-                while cur_x >= w:
-                    cur_x -= w
-                    y += 1
+                if cur_x >= w:
+                    y += cur_x // w
+                    cur_x %= w
                 # draw the ones
                 o = ones
                 left = w - cur_x
-                while o >= left:
+                if o >= left:
+                    # finish the current row, then draw full rows, then the start of the last row
                     hline(x + cur_x, y, left, color)
-                    o -= left
-                    cur_x = 0
                     y += 1
-                    left = w
-                if o > 0:
+                    o -= left
+                    full = o // w
+                    if full > 1 and fill_rect is not None:
+                        fill_rect(x, y, w, full, color)
+                        y += full
+                    else:
+                        for _ in range(full):
+                            hline(x, y, w, color)
+                            y += 1
+                    cur_x = o % w
+                    if cur_x > 0:
+                        hline(x, y, cur_x, color)
+                elif o > 0:
                     hline(x + cur_x, y, o, color)
                     cur_x += o
                 # read next bit and repeat if it's a one
@@ -261,13 +458,19 @@ class Font:
         if hline is None:
             hline = self.hline
         x = x0
-        draw_glyph = self.draw_glyph
-        for ch in string.encode():  # FIXME: only supports ascii! but 'for ch in string' is horrid
-            cd = draw_glyph(hline, ch, x, y, color)
-            if cd is None:
-                raise ValueError("Glyph %d not found" % ch)
-            else:
-                x += cd
+        hdr_cache = self.hdr_cache
+        blit = self._blit
+        bs = string.encode()  # FIXME: only supports ascii! but 'for ch in string' is horrid
+        for i in range(len(bs)):
+            ch = bs[i]
+            hdr = hdr_cache.get(ch)
+            if hdr is None:
+                # bytes are < 0x100 so the glyph can only be in the "ascii" portion
+                gl_ix = self._find_ascii(ch)
+                if gl_ix is None:
+                    raise ValueError("Glyph %d not found" % ch)
+                hdr = self._cache_hdr(ch, gl_ix)
+            x += blit(hline, hdr, x, y, color)
         Font.ticks += ticks_diff(ticks_ms(), t0)
         return x - x0
 
@@ -277,13 +480,17 @@ class Font:
         width = 0
         height = 0
         rise = 0
-        for cp in string.encode():  # FIXME: doesn't support unicode
-            # cp = ord(ch)
-            #
-            hdr = self.glyph_header(cp)
+        hdr_cache = self.hdr_cache
+        bs = string.encode()  # FIXME: doesn't support unicode
+        for i in range(len(bs)):
+            cp = bs[i]
+            hdr = hdr_cache.get(cp)
             if hdr is None:
-                Font.ticks += ticks_diff(ticks_ms(), t0)
-                raise ValueError("Glyph %d not found" % cp)
+                gl_ix = self._find_ascii(cp)
+                if gl_ix is None:
+                    Font.ticks += ticks_diff(ticks_ms(), t0)
+                    raise ValueError("Glyph %d not found" % cp)
+                hdr = self._cache_hdr(cp, gl_ix)
             h = hdr[1]
             up = hdr[3]
             cd = hdr[4]